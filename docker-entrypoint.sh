@@ -3,8 +3,10 @@ set -e
 
 echo "🚀 Starting Recipe Chatbot Agent..."
 
-# Kiểm tra xem có index files không
-if [ ! -f "$VECTOR_INDEX_PATH" ] || [ ! -f "$VECTOR_META_PATH" ]; then
+# Kiểm tra xem có index files không (ưu tiên artifact đã version hoá)
+if [ -n "$VECTOR_ARTIFACT_DIR" ] && [ -f "$VECTOR_ARTIFACT_DIR/current" ]; then
+    echo "✅ Found artifact version $(cat "$VECTOR_ARTIFACT_DIR/current") in $VECTOR_ARTIFACT_DIR"
+elif [ ! -f "$VECTOR_INDEX_PATH" ] || [ ! -f "$VECTOR_META_PATH" ]; then
     echo "⚠️  Index files not found at startup."
     echo "📝 You can create them by:"
     echo "   1. Using the /train endpoint after the service starts"
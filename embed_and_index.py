@@ -1,9 +1,11 @@
-# Usage: python embed_and_index.py --docs docs.jsonl --index out.index --meta meta.json
+# Usage: python embed_and_index.py --docs docs.jsonl --artifact-dir artifacts [--vector-dtype float16] [--compare]
+#    or (legacy files): python embed_and_index.py --docs docs.jsonl --index out.index --meta meta.json
 # REPLACED: safe import with diagnostic on failure
 import argparse, json
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import faiss
+import index_artifacts
 
 def load_docs(path):
     docs = []
@@ -51,17 +53,24 @@ def simple_chunk_text(text, chunk_size=1024, overlap=80):
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--docs", required=True)
-    p.add_argument("--index", required=True)
-    p.add_argument("--meta", required=True)
+    p.add_argument("--index")
+    p.add_argument("--meta")
+    p.add_argument("--artifact-dir", help="write a versioned artifact bundle and make it current")
+    p.add_argument("--vector-dtype", default="float16", choices=index_artifacts.VECTOR_DTYPES)
+    p.add_argument("--compare", action="store_true", help="report size/load time vs legacy out.index + meta.json")
     p.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    p.add_argument("--chunk-size", type=int, default=1024)
+    p.add_argument("--chunk-overlap", type=int, default=80)
     args = p.parse_args()
+    if not args.artifact_dir and not (args.index and args.meta):
+        p.error("either --artifact-dir or both --index and --meta are required")
 
     docs = load_docs(args.docs)
     texts = []
     meta = []
     for d in docs:
         txt = doc_to_text(d)
-        chunks = simple_chunk_text(txt, 1024, 80)
+        chunks = simple_chunk_text(txt, args.chunk_size, args.chunk_overlap)
         for c in chunks:
             texts.append(c)
             meta.append({"id": d.get("id"), "title": d.get("title"), "text": c})
@@ -75,14 +84,31 @@ def main():
         model = SentenceTransformer(args.model)
         embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True, normalize_embeddings=True)
 
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(np.array(embeddings, dtype=np.float32))
-    faiss.write_index(index, args.index)
-    with open(args.meta, "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
-
-    print(f"Saved index {args.index} and metadata {args.meta}")
+    embeddings = np.array(embeddings, dtype=np.float32)
+    if args.artifact_dir:
+        index = index_artifacts.build_index(embeddings, args.vector_dtype)
+        config = {
+            "model": args.model,
+            "chunk_size": args.chunk_size,
+            "chunk_overlap": args.chunk_overlap,
+            "vector_dtype": args.vector_dtype,
+            "source": args.docs,
+        }
+        manifest = index_artifacts.write_artifact(args.artifact_dir, index, meta, config)
+        print(f"Saved artifact {manifest['version']} to {args.artifact_dir} (current)")
+        if args.compare:
+            r = index_artifacts.compare_with_legacy(args.artifact_dir, manifest["version"], embeddings, meta)
+            print(f"Size: legacy {r['legacy_bytes']} B -> artifact {r['artifact_bytes']} B ({r['size_ratio']:.1%})")
+            print(f"Load: legacy {r['legacy_load_s']*1000:.1f} ms -> artifact {r['artifact_load_s']*1000:.1f} ms "
+                  f"with checksum verify (server path), {r['artifact_load_noverify_s']*1000:.1f} ms without")
+    if args.index and args.meta:
+        dim = embeddings.shape[1]
+        index = faiss.IndexFlatIP(dim)
+        index.add(embeddings)
+        faiss.write_index(index, args.index)
+        with open(args.meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        print(f"Saved index {args.index} and metadata {args.meta}")
 
 if __name__ == "__main__":
     main()
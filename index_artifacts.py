@@ -0,0 +1,253 @@
+# Versioned index artifact bundles: index + metadata + config + checksums
+# Layout:
+#   <root>/versions/<version>/index.faiss     faiss index (float32 / float16 / sq8 vectors)
+#   <root>/versions/<version>/meta.json.zst   compact JSON metadata, zstd (gzip if zstandard is missing)
+#   <root>/versions/<version>/manifest.json   version, config, codec and sha256 of every file
+#   <root>/current                            name of the active version
+# Versions are written to a temp dir and renamed into place, and "current" is swapped
+# with os.replace, so readers never see a half-written bundle.
+import os, re, json, gzip, time, shutil, hashlib, tempfile, uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import faiss
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "current"
+VERSIONS_DIR = "versions"
+FORMAT_VERSION = 1
+VECTOR_DTYPES = ("float32", "float16", "sq8")
+VERSION_RE = re.compile(r"^v\d{8}T\d{6}Z-[0-9a-f]{6}$")
+
+def sha256_file(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def build_index(embeddings, vector_dtype="float16"):
+    """Inner-product index with the requested vector storage."""
+    embs = np.ascontiguousarray(embeddings, dtype=np.float32)
+    dim = embs.shape[1]
+    if vector_dtype == "float32":
+        idx = faiss.IndexFlatIP(dim)
+    elif vector_dtype == "float16":
+        idx = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    elif vector_dtype == "sq8":
+        idx = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unknown vector_dtype {vector_dtype!r}, expected one of {VECTOR_DTYPES}")
+    if not idx.is_trained:
+        idx.train(embs)
+    idx.add(embs)
+    return idx
+
+def _meta_codec():
+    return "zstd" if zstd is not None else "gzip"
+
+def _meta_filename(codec):
+    return "meta.json.zst" if codec == "zstd" else "meta.json.gz"
+
+def compress_meta(meta_list, codec):
+    raw = json.dumps(meta_list, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if codec == "zstd":
+        if zstd is None:
+            raise RuntimeError("zstandard is not installed; cannot write zstd metadata")
+        return zstd.ZstdCompressor(level=10).compress(raw)
+    return gzip.compress(raw, compresslevel=6)
+
+def decompress_meta(data, codec):
+    if codec == "zstd":
+        if zstd is None:
+            raise RuntimeError("zstandard is not installed; cannot read zstd metadata")
+        raw = zstd.ZstdDecompressor().decompress(data)
+    elif codec == "gzip":
+        raw = gzip.decompress(data)
+    else:
+        raise ValueError(f"Unknown metadata codec {codec!r}")
+    return json.loads(raw.decode("utf-8"))
+
+def new_version_name():
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return f"v{stamp}-{uuid.uuid4().hex[:6]}"
+
+def is_valid_version(version):
+    """Only names produced by new_version_name are accepted (no paths)."""
+    return (isinstance(version, str) and os.path.basename(version) == version
+            and VERSION_RE.match(version) is not None)
+
+def _check_version(version):
+    if not is_valid_version(version):
+        raise FileNotFoundError(f"Invalid artifact version: {version!r}")
+
+def write_artifact(root, index_obj, meta_list, config=None, version=None, activate=True):
+    """
+    Write a new version bundle under root and (optionally) point "current" at it.
+    Returns the manifest dict.
+    """
+    version = version or new_version_name()
+    _check_version(version)
+    versions_dir = os.path.join(root, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+    final_dir = os.path.join(versions_dir, version)
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"Artifact version already exists: {version}")
+    tmp_dir = tempfile.mkdtemp(prefix=f".tmp-{version}-", dir=versions_dir)
+    try:
+        codec = _meta_codec()
+        meta_name = _meta_filename(codec)
+        faiss.write_index(index_obj, os.path.join(tmp_dir, INDEX_FILE))
+        with open(os.path.join(tmp_dir, meta_name), "wb") as f:
+            f.write(compress_meta(meta_list, codec))
+        files = {}
+        for name in (INDEX_FILE, meta_name):
+            path = os.path.join(tmp_dir, name)
+            files[name] = {"sha256": sha256_file(path), "bytes": os.path.getsize(path)}
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "count": int(index_obj.ntotal),
+            "dim": int(index_obj.d),
+            "meta_file": meta_name,
+            "meta_codec": codec,
+            "config": dict(config or {}),
+            "files": files,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.rename(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if activate:
+        set_current(root, version)
+    return manifest
+
+def set_current(root, version):
+    """Atomically point root/current at an existing version."""
+    _check_version(version)
+    if not os.path.isfile(os.path.join(root, VERSIONS_DIR, version, MANIFEST_FILE)):
+        raise FileNotFoundError(f"Artifact version not found: {version}")
+    tmp_path = os.path.join(root, f".{CURRENT_FILE}.{uuid.uuid4().hex}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+def get_current(root):
+    path = os.path.join(root, CURRENT_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+def clear_current(root):
+    """Remove the current pointer (e.g. after writing the legacy format)."""
+    try:
+        os.remove(os.path.join(root, CURRENT_FILE))
+    except FileNotFoundError:
+        pass
+
+def read_manifest(root, version):
+    _check_version(version)
+    with open(os.path.join(root, VERSIONS_DIR, version, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def list_versions(root):
+    """Manifests of all complete versions, oldest first."""
+    versions_dir = os.path.join(root, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    out = []
+    for name in os.listdir(versions_dir):
+        if not is_valid_version(name) or not os.path.isfile(os.path.join(versions_dir, name, MANIFEST_FILE)):
+            continue
+        out.append(read_manifest(root, name))
+    return sorted(out, key=lambda m: m["created_at"])
+
+def load_artifact(root, version=None, verify=True):
+    """
+    Load (index, meta_list, manifest) for version, or the current version.
+    With verify=True every file is checked against the manifest sha256.
+    """
+    version = version or get_current(root)
+    if not version:
+        raise FileNotFoundError(f"No current artifact version in {root}. Train first.")
+    version_dir = os.path.join(root, VERSIONS_DIR, version)
+    manifest = read_manifest(root, version)
+    # each file is read once; the same bytes are hashed and deserialized
+    data = {}
+    for name in (INDEX_FILE, manifest["meta_file"]):
+        with open(os.path.join(version_dir, name), "rb") as f:
+            data[name] = f.read()
+    hasher = None
+    if verify:
+        # hashlib releases the GIL on large buffers, so hashing overlaps with parsing
+        hasher = ThreadPoolExecutor(max_workers=1)
+        digests = {name: hasher.submit(lambda b: hashlib.sha256(b).hexdigest(), b) for name, b in data.items()}
+    try:
+        idx = faiss.deserialize_index(np.frombuffer(data[INDEX_FILE], dtype=np.uint8))
+        meta_list = decompress_meta(data[manifest["meta_file"]], manifest["meta_codec"])
+    finally:
+        if hasher is not None:
+            hasher.shutdown(wait=True)
+    if verify:
+        for name, digest in digests.items():
+            if digest.result() != manifest["files"][name]["sha256"]:
+                raise ValueError(f"Checksum mismatch for {version}/{name}")
+    if len(meta_list) != idx.ntotal:
+        raise ValueError(f"Artifact {version} has {idx.ntotal} vectors but {len(meta_list)} metadata rows")
+    return idx, meta_list, manifest
+
+def compare_with_legacy(root, version, embeddings, meta_list, repeats=3):
+    """
+    Write the legacy out.index + indented meta.json to a temp dir and compare
+    on-disk size and load time with the given artifact version. The artifact is
+    timed with checksum verification (the server load path) and without.
+    """
+    version_dir = os.path.join(root, VERSIONS_DIR, version)
+    manifest = read_manifest(root, version)
+    artifact_bytes = sum(info["bytes"] for info in manifest["files"].values())
+    artifact_bytes += os.path.getsize(os.path.join(version_dir, MANIFEST_FILE))
+
+    def _best(fn):
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        return min(times)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_index = os.path.join(tmp, "out.index")
+        legacy_meta = os.path.join(tmp, "meta.json")
+        flat = faiss.IndexFlatIP(embeddings.shape[1])
+        flat.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+        faiss.write_index(flat, legacy_index)
+        with open(legacy_meta, "w", encoding="utf-8") as f:
+            json.dump(meta_list, f, ensure_ascii=False, indent=2)
+        legacy_bytes = os.path.getsize(legacy_index) + os.path.getsize(legacy_meta)
+
+        def _load_legacy():
+            faiss.read_index(legacy_index)
+            with open(legacy_meta, "r", encoding="utf-8") as f:
+                json.load(f)
+
+        legacy_load = _best(_load_legacy)
+    artifact_load = _best(lambda: load_artifact(root, version, verify=True))
+    artifact_load_noverify = _best(lambda: load_artifact(root, version, verify=False))
+    return {
+        "legacy_bytes": legacy_bytes,
+        "artifact_bytes": artifact_bytes,
+        "size_ratio": artifact_bytes / legacy_bytes if legacy_bytes else None,
+        "legacy_load_s": legacy_load,
+        "artifact_load_s": artifact_load,
+        "artifact_load_noverify_s": artifact_load_noverify,
+    }
@@ -0,0 +1,186 @@
+# Second-stage rerank for /search: score (query, chunk) pairs under a latency budget.
+# A scorer is any object with score(query, texts) -> list[float] (higher = more relevant),
+# so tests can plug in TokenOverlapScorer instead of loading a cross-encoder.
+import re, time, hashlib, threading
+from collections import OrderedDict
+
+class CrossEncoderScorer:
+    """sentence-transformers CrossEncoder; all pairs are scored in one batch."""
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"):
+        from sentence_transformers import CrossEncoder
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name)
+
+    def score(self, query, texts):
+        pairs = [(query, t) for t in texts]
+        scores = self.model.predict(pairs, batch_size=max(1, len(pairs)), show_progress_bar=False)
+        return [float(s) for s in scores]
+
+class TokenOverlapScorer:
+    """Cheap deterministic scorer: fraction of query tokens found in the text."""
+
+    token_re = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self):
+        self.calls = 0
+
+    def score(self, query, texts):
+        self.calls += 1
+        q = set(self.token_re.findall(query.lower()))
+        out = []
+        for t in texts:
+            words = set(self.token_re.findall(t.lower()))
+            out.append(len(q & words) / len(q) if q else 0.0)
+        return out
+
+class BudgetedReranker:
+    """
+    Reranks first-stage candidates with a scorer, caching pair scores and
+    only scoring as many uncached pairs as the latency budget allows.
+
+    Scorer cost is modelled as batch_ms + n * pair_ms. After each batch the
+    prediction error is split between the two terms by their share of the
+    prediction (small batches mostly move batch_ms, large ones pair_ms) and
+    both are smoothed. Observations are capped at max_spike times the
+    prediction and both terms are clamped, so one stalled call (GC pause,
+    cold start) cannot push the estimate far past the budget.
+
+    The scorer is only called when estimate_ms(n) fits the remaining budget;
+    a request that cannot afford even one pair stays on first-stage order.
+    An over-estimate is corrected by the requests that do score (larger
+    budgets, or fewer pairs), which pull both terms toward observed cost.
+    """
+
+    def __init__(self, scorer, cache_size=10000, initial_pair_ms=5.0, initial_batch_ms=5.0,
+                 smoothing=0.2, max_spike=4.0, max_pair_ms=20.0, max_batch_ms=50.0):
+        self.scorer = scorer
+        self.cache_size = cache_size
+        self.smoothing = smoothing
+        self.max_spike = max_spike
+        self.max_pair_ms = max_pair_ms
+        self.max_batch_ms = max_batch_ms
+        self.pair_ms = initial_pair_ms
+        self.batch_ms = initial_batch_ms
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def estimate_ms(self, n):
+        """Predicted scorer time for a batch of n uncached pairs."""
+        return self.batch_ms + n * self.pair_ms if n else 0.0
+
+    def max_pairs(self, budget_ms):
+        """Largest n with estimate_ms(n) <= budget_ms (None = unbounded)."""
+        if budget_ms is None:
+            return None
+        with self._lock:
+            batch_ms, pair_ms = self.batch_ms, self.pair_ms
+        if budget_ms < batch_ms + pair_ms:
+            return 0
+        return int((budget_ms - batch_ms) / pair_ms)
+
+    def _observe(self, n, elapsed_ms):
+        with self._lock:
+            predicted = self.estimate_ms(n)
+            elapsed_ms = min(elapsed_ms, self.max_spike * predicted)
+            residual = elapsed_ms - predicted
+            batch_share = self.batch_ms / predicted if predicted > 0 else 0.5
+            batch_obs = self.batch_ms + residual * batch_share
+            pair_obs = self.pair_ms + residual * (1 - batch_share) / n
+            a = self.smoothing
+            batch_ms = (1 - a) * self.batch_ms + a * batch_obs
+            pair_ms = (1 - a) * self.pair_ms + a * pair_obs
+            self.batch_ms = min(max(batch_ms, 0.0), self.max_batch_ms)
+            self.pair_ms = min(max(pair_ms, 0.01), self.max_pair_ms)
+
+    @staticmethod
+    def _key(query, text):
+        return hashlib.sha1((query + "\0" + text).encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def _cache_put(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query, texts, budget_ms=None):
+        """
+        texts are in first-stage order. Returns (order, scores, info):
+        order is a permutation of range(len(texts)); the reranked prefix comes
+        first sorted by score, the rest keeps first-stage order. scores maps
+        index -> rerank score for reranked candidates. info["path"] is
+        "rerank", "partial" or "first_stage".
+        """
+        t0 = time.perf_counter()
+        keys = [self._key(query, t) for t in texts]
+        cached = {}
+        for i, key in enumerate(keys):
+            s = self._cache_get(key)
+            if s is not None:
+                cached[i] = s
+
+        # how many uncached pairs fit into what is left of the budget
+        remaining_ms = None
+        if budget_ms is not None:
+            remaining_ms = max(0.0, budget_ms - (time.perf_counter() - t0) * 1000)
+        max_misses = self.max_pairs(remaining_ms)
+        if max_misses is None:
+            max_misses = len(texts)
+
+        # rerank the longest first-stage prefix whose uncached pairs fit
+        prefix = 0
+        to_score = []
+        for i in range(len(texts)):
+            if i not in cached:
+                if len(to_score) == max_misses:
+                    break
+                to_score.append(i)
+            prefix += 1
+
+        scores = {i: cached[i] for i in range(prefix) if i in cached}
+        error = None
+        if to_score:
+            t1 = time.perf_counter()
+            try:
+                batch = self.scorer.score(query, [texts[i] for i in to_score])
+                if len(batch) != len(to_score):
+                    raise ValueError("scorer returned %d scores for %d pairs" % (len(batch), len(to_score)))
+            except Exception as e:
+                error = str(e)
+                prefix = 0
+                scores = {}
+            else:
+                self._observe(len(to_score), (time.perf_counter() - t1) * 1000)
+                for i, s in zip(to_score, batch):
+                    s = float(s)
+                    scores[i] = s
+                    self._cache_put(keys[i], s)
+
+        head = sorted(range(prefix), key=lambda i: -scores[i])
+        order = head + list(range(prefix, len(texts)))
+        if prefix == 0:
+            path = "first_stage"
+        elif prefix < len(texts):
+            path = "partial"
+        else:
+            path = "rerank"
+        info = {
+            "path": path,
+            "candidates": len(texts),
+            "reranked": prefix,
+            "scored": len(to_score) if error is None else 0,
+            "cache_hits": sum(1 for i in range(prefix) if i in cached),
+            "budget_ms": budget_ms,
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 3),
+        }
+        if error:
+            info["error"] = error
+        return order, scores, info
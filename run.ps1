@@ -61,9 +61,9 @@ if (-not $SkipEmbed) {
     Write-Host "`n============================================================" -ForegroundColor Cyan
     Write-Host "📋 Bước 2: Tạo embeddings và index" -ForegroundColor Cyan
     Write-Host "============================================================" -ForegroundColor Cyan
-    Write-Host "🔧 Command: $venvPython embed_and_index.py --docs docs.jsonl --index out.index --meta meta.json`n" -ForegroundColor Gray
+    Write-Host "🔧 Command: $venvPython embed_and_index.py --docs docs.jsonl --artifact-dir artifacts`n" -ForegroundColor Gray
     
-    & $venvPython embed_and_index.py --docs docs.jsonl --index out.index --meta meta.json
+    & $venvPython embed_and_index.py --docs docs.jsonl --artifact-dir artifacts
     if ($LASTEXITCODE -ne 0) {
         Write-Host "`n❌ Lỗi khi chạy embed_and_index.py" -ForegroundColor Red
         exit 1
@@ -73,8 +73,7 @@ def main():
         cmd = python_cmd + [
             "embed_and_index.py",
             "--docs", "docs.jsonl",
-            "--index", "out.index",
-            "--meta", "meta.json"
+            "--artifact-dir", "artifacts"
         ]
         run_command(cmd, "Bước 2: Tạo embeddings và index")
     else:
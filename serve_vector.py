@@ -1,15 +1,25 @@
 # Usage: uvicorn serve_vector:app --reload --host 0.0.0.0 --port 8000
-import os, json, requests
+import os, json, time, threading, requests
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
+import index_artifacts
+import rerank
 
 INDEX_PATH = os.environ.get("VECTOR_INDEX_PATH", "out.index")
 META_PATH = os.environ.get("VECTOR_META_PATH", "meta.json")
+# versioned artifact bundles (preferred); legacy INDEX_PATH/META_PATH are used when no "current" version exists
+ARTIFACT_DIR = os.environ.get("VECTOR_ARTIFACT_DIR", "artifacts")
+VECTOR_DTYPE = os.environ.get("VECTOR_DTYPE", "float16")
 MODEL_NAME = os.environ.get("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# second stage: a cross-encoder name (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2), or
+# "token-overlap" for the cheap deterministic scorer; empty disables reranking
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "")
+RERANK_OVERFETCH = int(os.environ.get("RERANK_OVERFETCH", "4"))
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", "150"))
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://host.docker.internal:11434")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2:latest")
 
@@ -19,20 +29,34 @@ print("Starting service...")
 # lazy globals
 index = None
 meta = []
+active_version = None
+state_lock = threading.Lock()
 embed_model = None
+reranker = None
+reranker_error = None
 llm_client = None
 
 class QueryIn(BaseModel):
     q: str
     k: int = 5
+    rerank: bool = False
+    candidates: Optional[int] = None  # first-stage over-fetch, default k * RERANK_OVERFETCH
+    budget_ms: Optional[float] = RERANK_BUDGET_MS  # whole-request budget, None = unbounded
 
 class TrainIn(BaseModel):
     source_url: str
-    index_path: Optional[str] = INDEX_PATH
-    meta_path: Optional[str] = META_PATH
+    # legacy mode only; default INDEX_PATH / META_PATH
+    index_path: Optional[str] = None
+    meta_path: Optional[str] = None
     model: Optional[str] = MODEL_NAME
     chunk_size: int = 1024
     chunk_overlap: int = 80
+    # write out.index/meta.json instead of a new version under ARTIFACT_DIR
+    legacy: bool = False
+    vector_dtype: Literal["float32", "float16", "sq8"] = VECTOR_DTYPE
+
+class ActivateIn(BaseModel):
+    version: str
 
 class ChatIn(BaseModel):
     input: str
@@ -117,20 +141,74 @@ def encode_texts(texts, model_name):
         norms[norms==0] = 1.0
         return arr / norms
 
+def get_reranker():
+    """
+    Loaded once at startup; a failed load is remembered so rerank requests
+    degrade to first-stage order instead of retrying the model load.
+    """
+    global reranker, reranker_error
+    if reranker:
+        return reranker
+    if reranker_error:
+        raise RuntimeError(reranker_error)
+    if not RERANK_MODEL:
+        raise RuntimeError("Reranking is not configured (set RERANK_MODEL)")
+    try:
+        if RERANK_MODEL == "token-overlap":
+            scorer = rerank.TokenOverlapScorer()
+        else:
+            scorer = rerank.CrossEncoderScorer(RERANK_MODEL)
+    except Exception as e:
+        reranker_error = f"Reranker {RERANK_MODEL} unavailable: {e}"
+        print(reranker_error)
+        raise RuntimeError(reranker_error) from e
+    print("Using reranker:", RERANK_MODEL)
+    reranker = rerank.BudgetedReranker(scorer)
+    return reranker
+
+@app.on_event("startup")
+def load_reranker():
+    if RERANK_MODEL:
+        try:
+            get_reranker()
+        except RuntimeError:
+            pass
+
 def save_index_and_meta(index_obj, meta_list, index_path, meta_path):
     faiss.write_index(index_obj, index_path)
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(meta_list, f, ensure_ascii=False, indent=2)
 
+def activate_version(version=None, artifact_dir=ARTIFACT_DIR):
+    """
+    Load an artifact version (default: current) and swap it in for serving.
+    The new index is fully loaded before the swap, so searches never see a gap.
+    """
+    global index, meta, active_version
+    idx, metas, manifest = index_artifacts.load_artifact(artifact_dir, version)
+    if version:
+        index_artifacts.set_current(artifact_dir, manifest["version"])
+    with state_lock:
+        index, meta, active_version = idx, metas, manifest["version"]
+    return manifest
+
 def load_index_and_meta(index_path=INDEX_PATH, meta_path=META_PATH):
     global index, meta
-    if index is None:
+    with state_lock:
+        if index is not None:
+            return index, meta
+    if ARTIFACT_DIR and index_artifacts.get_current(ARTIFACT_DIR):
+        activate_version()
+    else:
         if not os.path.exists(index_path) or not os.path.exists(meta_path):
             raise FileNotFoundError("Index or meta file not found. Train first.")
-        index = faiss.read_index(index_path)
+        idx = faiss.read_index(index_path)
         with open(meta_path, "r", encoding="utf-8") as f:
-            meta = json.load(f)
-    return index, meta
+            metas = json.load(f)
+        with state_lock:
+            index, meta = idx, metas
+    with state_lock:
+        return index, meta
 
 def get_ollama_client():
     global llm_client
@@ -149,6 +227,13 @@ def train(body: TrainIn):
     """
     Fetch data from source_url, build chunks, embeddings and faiss index, save index+meta.
     """
+    artifact_mode = bool(ARTIFACT_DIR) and not body.legacy
+    if artifact_mode and (body.index_path or body.meta_path):
+        raise HTTPException(
+            status_code=400,
+            detail="index_path/meta_path are only used with \"legacy\": true; "
+                   "artifact versions are written under VECTOR_ARTIFACT_DIR",
+        )
     try:
         payload = fetch_json(body.source_url)
     except Exception as e:
@@ -172,24 +257,74 @@ def train(body: TrainIn):
     norms = np.linalg.norm(embs, axis=1, keepdims=True)
     norms[norms==0] = 1.0
     embs = embs / norms
+    global index, meta, active_version
+    if artifact_mode:
+        # write a new version; previous versions stay on disk for rollback
+        idx = index_artifacts.build_index(embs, body.vector_dtype)
+        config = {
+            "model": body.model,
+            "chunk_size": body.chunk_size,
+            "chunk_overlap": body.chunk_overlap,
+            "vector_dtype": body.vector_dtype,
+            "source": body.source_url,
+        }
+        manifest = index_artifacts.write_artifact(ARTIFACT_DIR, idx, meta_list, config)
+        with state_lock:
+            index, meta, active_version = idx, meta_list, manifest["version"]
+        return {"status": "ok", "indexed": len(texts), "artifact_dir": ARTIFACT_DIR, "version": manifest["version"]}
     dim = embs.shape[1]
     idx = faiss.IndexFlatIP(dim)
     idx.add(embs)
-    save_index_and_meta(idx, meta_list, body.index_path, body.meta_path)
+    index_path = body.index_path or INDEX_PATH
+    meta_path = body.meta_path or META_PATH
+    save_index_and_meta(idx, meta_list, index_path, meta_path)
+    # drop the current pointer so a restart serves these files, not a stale version;
+    # /versions/activate switches back to an artifact
+    if ARTIFACT_DIR:
+        index_artifacts.clear_current(ARTIFACT_DIR)
     # update in-memory
-    global index, meta
-    index = idx
-    meta = meta_list
-    return {"status": "ok", "indexed": len(texts), "index_path": body.index_path, "meta_path": body.meta_path}
+    with state_lock:
+        index, meta, active_version = idx, meta_list, None
+    return {"status": "ok", "indexed": len(texts), "index_path": index_path, "meta_path": meta_path}
+
+@app.get("/versions")
+def versions():
+    """List artifact versions and which one is current / being served."""
+    if not ARTIFACT_DIR:
+        return {"current": None, "active": None, "versions": []}
+    manifests = index_artifacts.list_versions(ARTIFACT_DIR)
+    return {
+        "current": index_artifacts.get_current(ARTIFACT_DIR),
+        "active": active_version,
+        "versions": [
+            {"version": m["version"], "created_at": m["created_at"], "count": m["count"], "config": m["config"]}
+            for m in manifests
+        ],
+    }
+
+@app.post("/versions/activate")
+def activate(body: ActivateIn):
+    """Switch serving to another artifact version (deploy or rollback) without restarting."""
+    if not ARTIFACT_DIR:
+        raise HTTPException(status_code=404, detail="VECTOR_ARTIFACT_DIR is not configured")
+    try:
+        manifest = activate_version(body.version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "ok", "version": manifest["version"], "count": manifest["count"]}
 
 @app.post("/search")
 def search(body: QueryIn):
+    t0 = time.perf_counter()
     q = body.q
     k = body.k
+    fetch_k = max(k, body.candidates or k * RERANK_OVERFETCH) if body.rerank else k
     try:
         idx, metas = load_index_and_meta()
         emb = encode_texts([q], MODEL_NAME)
-        D, I = idx.search(emb, k)
+        D, I = idx.search(emb, fetch_k)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Search error: " + str(e))
     results = []
@@ -198,4 +333,21 @@ def search(body: QueryIn):
             continue
         m = metas[ind]
         results.append({"score": float(dist), "meta": m})
-    return {"results": results}
\ No newline at end of file
+    if not body.rerank:
+        return {"results": results}
+    # second stage gets whatever is left of the request budget
+    budget = None
+    if body.budget_ms is not None:
+        budget = max(0.0, body.budget_ms - (time.perf_counter() - t0) * 1000)
+    try:
+        rr = get_reranker()
+    except Exception as e:
+        return {"results": results[:k], "rerank": {"path": "first_stage", "error": str(e)}}
+    order, scores, info = rr.rerank(q, [r["meta"].get("text", "") for r in results], budget_ms=budget)
+    reranked = []
+    for i in order[:k]:
+        r = results[i]
+        if i in scores:
+            r["rerank_score"] = scores[i]
+        reranked.append(r)
+    return {"results": reranked, "rerank": info}
\ No newline at end of file
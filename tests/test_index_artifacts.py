@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+import index_artifacts as ia
+
+def make_data(n=64, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    embs = rng.standard_normal((n, dim)).astype("float32")
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+    meta = [{"id": i, "title": f"Món {i}", "text": f"chunk {i}"} for i in range(n)]
+    return embs, meta
+
+@pytest.mark.parametrize("dtype", ia.VECTOR_DTYPES)
+def test_round_trip(tmp_path, dtype):
+    embs, meta = make_data()
+    manifest = ia.write_artifact(tmp_path, ia.build_index(embs, dtype), meta, {"vector_dtype": dtype})
+    assert ia.get_current(tmp_path) == manifest["version"]
+    idx, loaded_meta, loaded_manifest = ia.load_artifact(tmp_path)
+    assert loaded_meta == meta
+    assert loaded_manifest["config"] == {"vector_dtype": dtype}
+    _, I = idx.search(embs[:5], 1)
+    assert list(I[:, 0]) == [0, 1, 2, 3, 4]
+
+def test_checksum_mismatch(tmp_path):
+    embs, meta = make_data()
+    manifest = ia.write_artifact(tmp_path, ia.build_index(embs), meta)
+    path = os.path.join(tmp_path, ia.VERSIONS_DIR, manifest["version"], manifest["meta_file"])
+    with open(path, "ab") as f:
+        f.write(b"x")
+    with pytest.raises(ValueError):
+        ia.load_artifact(tmp_path)
+
+def test_rollback(tmp_path):
+    embs, meta = make_data()
+    first = ia.write_artifact(tmp_path, ia.build_index(embs), meta)
+    second = ia.write_artifact(tmp_path, ia.build_index(embs[:10]), meta[:10])
+    assert ia.get_current(tmp_path) == second["version"]
+    assert [m["version"] for m in ia.list_versions(tmp_path)] == [first["version"], second["version"]]
+    ia.set_current(tmp_path, first["version"])
+    assert ia.load_artifact(tmp_path)[0].ntotal == len(meta)
+    ia.clear_current(tmp_path)
+    assert ia.get_current(tmp_path) is None
+
+def test_rejects_paths_as_versions(tmp_path):
+    embs, meta = make_data()
+    other = tmp_path / "other"
+    manifest = ia.write_artifact(other, ia.build_index(embs), meta)
+    root = tmp_path / "root"
+    ia.write_artifact(root, ia.build_index(embs), meta)
+    escape = os.path.join("..", "..", "other", ia.VERSIONS_DIR, manifest["version"])
+    for bad in (escape, str(other / ia.VERSIONS_DIR / manifest["version"]), "current", ""):
+        with pytest.raises(FileNotFoundError):
+            ia.set_current(root, bad)
+        if bad:
+            with pytest.raises(FileNotFoundError):
+                ia.load_artifact(root, bad)
+
+def test_compare_reports_verified_load(tmp_path):
+    embs, meta = make_data()
+    manifest = ia.write_artifact(tmp_path, ia.build_index(embs), meta)
+    report = ia.compare_with_legacy(tmp_path, manifest["version"], embs, meta, repeats=1)
+    assert report["artifact_load_s"] > 0 and report["artifact_load_noverify_s"] > 0
+    assert report["artifact_bytes"] > 0 and report["legacy_bytes"] > 0
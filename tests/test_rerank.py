@@ -0,0 +1,98 @@
+import time
+
+import rerank
+
+QUERY = "cách nấu phở bò"
+TEXTS = ["phở bò hà nội", "bún chả", "cách nấu phở bò ngon", "gỏi cuốn tôm", "phở gà"]
+
+def test_full_rerank_orders_by_score():
+    r = rerank.BudgetedReranker(rerank.TokenOverlapScorer())
+    order, scores, info = r.rerank(QUERY, TEXTS)
+    assert info["path"] == "rerank"
+    assert order[0] == 2
+    assert sorted(order) == list(range(len(TEXTS)))
+    assert set(scores) == set(range(len(TEXTS)))
+
+def test_cache_hits_cost_no_budget():
+    scorer = rerank.TokenOverlapScorer()
+    r = rerank.BudgetedReranker(scorer)
+    r.rerank(QUERY, TEXTS)
+    order, _, info = r.rerank(QUERY, TEXTS, budget_ms=0)
+    assert scorer.calls == 1
+    assert info["path"] == "rerank"
+    assert info["cache_hits"] == len(TEXTS)
+    assert order[0] == 2
+
+def test_partial_keeps_first_stage_tail():
+    r = rerank.BudgetedReranker(rerank.TokenOverlapScorer(), initial_batch_ms=0.0, initial_pair_ms=10.0)
+    order, scores, info = r.rerank(QUERY, TEXTS, budget_ms=25)
+    assert info["path"] == "partial"
+    assert info["reranked"] == 2
+    assert order == [0, 1, 2, 3, 4]
+    assert set(scores) == {0, 1}
+
+def test_exhausted_budget_is_first_stage():
+    scorer = rerank.TokenOverlapScorer()
+    r = rerank.BudgetedReranker(scorer)
+    order, scores, info = r.rerank(QUERY, TEXTS, budget_ms=0)
+    assert info["path"] == "first_stage"
+    assert order == list(range(len(TEXTS)))
+    assert scores == {}
+    assert scorer.calls == 0
+
+def test_scorer_error_falls_back():
+    class Broken:
+        def score(self, query, texts):
+            raise RuntimeError("down")
+
+    order, scores, info = rerank.BudgetedReranker(Broken()).rerank(QUERY, TEXTS)
+    assert info["path"] == "first_stage"
+    assert info["error"] == "down"
+    assert order == list(range(len(TEXTS)))
+
+def test_single_stall_does_not_disable_reranking():
+    class Stalling(rerank.TokenOverlapScorer):
+        def score(self, query, texts):
+            if self.calls == 0:
+                time.sleep(0.5)
+            return super().score(query, texts)
+
+    r = rerank.BudgetedReranker(Stalling())
+    r.rerank("q", ["one"])  # 1-pair cold-start call stalls
+    assert r.estimate_ms(1) < 150
+    texts = [f"text {i}" for i in range(20)]
+    paths = [r.rerank(f"phở {i}", texts, budget_ms=150)[2]["path"] for i in range(5)]
+    assert "first_stage" not in paths
+    assert paths[-1] == "rerank"
+
+def test_overestimate_skips_scorer_then_recovers():
+    scorer = rerank.TokenOverlapScorer()
+    r = rerank.BudgetedReranker(scorer, initial_pair_ms=20.0, initial_batch_ms=50.0)
+    texts = [f"text {i}" for i in range(20)]
+    info = r.rerank("phở", texts, budget_ms=60)[2]
+    assert info["path"] == "first_stage"
+    assert scorer.calls == 0
+    # an unbounded request observes the real (fast) cost and pulls the estimate down
+    r.rerank("bún", texts)
+    for i in range(30):
+        info = r.rerank(f"phở {i}", texts, budget_ms=60)[2]
+    assert info["path"] == "rerank"
+
+def test_slow_scorer_not_called_with_too_small_budget():
+    class Slow(rerank.TokenOverlapScorer):
+        def score(self, query, texts):
+            time.sleep(0.04)
+            return super().score(query, texts)
+
+    scorer = Slow()
+    r = rerank.BudgetedReranker(scorer)
+    for i in range(5):
+        r.rerank(f"warm {i}", ["a", "b"])
+    calls = scorer.calls
+    assert r.estimate_ms(1) > 5
+    for i in range(5):
+        t0 = time.perf_counter()
+        info = r.rerank(f"q {i}", ["a", "b"], budget_ms=5)[2]
+        assert (time.perf_counter() - t0) * 1000 < 20
+        assert info["path"] == "first_stage"
+    assert scorer.calls == calls
@@ -0,0 +1,142 @@
+import json
+import time
+
+import pytest
+
+import translate_readme as tr
+
+DOC = """# Tiêu đề
+
+Đoạn một có `inline_code` và [link](https://example.com/a).
+
+```python
+print("không dịch")
+```
+
+Đoạn hai.
+
+Đoạn hai.
+"""
+
+def run(content, memory, backend=None, **kwargs):
+    backend = backend or tr.FakeBackend("vi", "en")
+    out = tr.translate_markdown(content, "vi", "en", backend=backend, memory=memory, **kwargs)
+    return out, backend
+
+def sent(backend):
+    return [t for call in backend.calls for t in call]
+
+def test_protects_code_links_and_dedups(tmp_path):
+    out, backend = run(DOC, tr.TranslationMemory(tmp_path / "tm.json"))
+    assert "`inline_code`" in out
+    assert "[link](https://example.com/a)" in out
+    assert 'print("không dịch")' in out
+    assert "[en] Đoạn hai." in out
+    # "Đoạn hai." appears twice but is sent once
+    assert sorted(sent(backend)) == sorted(set(sent(backend)))
+    assert len(sent(backend)) == 3
+
+def test_memory_hits_and_only_edited_paragraph_resent(tmp_path):
+    path = tmp_path / "tm.json"
+    first, _ = run(DOC, tr.TranslationMemory(path))
+    again, backend = run(DOC, tr.TranslationMemory(path))
+    assert again == first
+    assert backend.calls == []
+
+    edited = DOC.replace("Đoạn hai.", "Đoạn ba.", 1)
+    _, backend = run(edited, tr.TranslationMemory(path))
+    assert sent(backend) == ["Đoạn ba."]
+
+def test_memory_ignores_non_dict_file(tmp_path):
+    path = tmp_path / "tm.json"
+    path.write_text(json.dumps(["not", "a", "dict"]), encoding="utf-8")
+    memory = tr.TranslationMemory(path)
+    assert memory.entries == {}
+    assert memory.get("fake", "vi", "en", "x") is None
+
+def test_memory_saved_when_interrupted(tmp_path):
+    class InterruptingBackend(tr.FakeBackend):
+        def translate_batch(self, texts):
+            if self.calls:
+                time.sleep(0.2)
+                raise KeyboardInterrupt
+            return super().translate_batch(texts)
+
+    path = tmp_path / "tm.json"
+    backend = InterruptingBackend("vi", "en")
+    with pytest.raises(KeyboardInterrupt):
+        run(DOC, tr.TranslationMemory(path), backend=backend, workers=1, batch_size=1)
+    assert len(json.loads(path.read_text(encoding="utf-8"))) == 1
+
+def test_retries_only_transient_errors(monkeypatch):
+    monkeypatch.setattr(tr.time, "sleep", lambda s: None)
+
+    class Flaky:
+        def __init__(self, exc):
+            self.exc = exc
+            self.attempts = 0
+
+        def translate_batch(self, texts):
+            self.attempts += 1
+            raise self.exc
+
+    flaky = Flaky(ConnectionError("reset"))
+    assert tr.translate_batch_with_retry(flaky, ["a"], max_retries=2) is None
+    assert flaky.attempts == 3
+
+    broken = Flaky(NameError("Translator"))
+    with pytest.raises(NameError):
+        tr.translate_batch_with_retry(broken, ["a"], max_retries=2)
+    assert broken.attempts == 1
+
+def test_get_backend_rejects_unavailable(monkeypatch):
+    monkeypatch.setattr(tr.GoogletransBackend, "available", False)
+    with pytest.raises(RuntimeError):
+        tr.get_backend("googletrans", "vi", "en")
+    with pytest.raises(ValueError):
+        tr.get_backend("nope", "vi", "en")
+    assert isinstance(tr.get_backend("fake", "vi", "en"), tr.FakeBackend)
+
+def test_memory_is_scoped_per_backend(tmp_path):
+    class OtherBackend(tr.FakeBackend):
+        name = "other"
+
+    path = tmp_path / "tm.json"
+    run(DOC, tr.TranslationMemory(path))
+    out, backend = run(DOC, tr.TranslationMemory(path), backend=OtherBackend("vi", "en"))
+    assert len(sent(backend)) == 3
+    assert all(key.startswith(("fake:", "other:")) for key in tr.TranslationMemory(path).entries)
+
+def test_placeholder_like_text_round_trips(tmp_path):
+    text = "Xem __PH_0__ và `code`."
+    out, _ = run(text, tr.TranslationMemory())
+    assert out == "[en] " + text
+
+def test_long_paragraph_is_split_and_reassembled():
+    sentence = "Câu thử nghiệm khá dài. "
+    paragraph = (sentence * 40).strip()
+    units = [v for kind, v in tr.split_units(paragraph, max_chars=200) if kind == 'unit']
+    assert len(units) > 1
+    assert all(len(u['text']) <= 200 for u in units)
+    assert "".join(u['lead'] + u['text'] + u['trail'] for u in units) == paragraph
+
+    backend = tr.FakeBackend("vi", "en")
+    out = tr.translate_markdown(paragraph, "vi", "en", backend=backend, memory=tr.TranslationMemory(),
+                                max_chars=200)
+    assert all(len(t) <= 200 for t in sent(backend))
+    assert out.count("[en] ") == len(units)
+
+def test_backend_text_error_keeps_source(monkeypatch):
+    class TextError(Exception):
+        pass
+
+    class Picky(tr.FakeBackend):
+        def translate_batch(self, texts):
+            if any("hai" in t for t in texts):
+                raise TextError("too long")
+            return super().translate_batch(texts)
+
+    monkeypatch.setattr(tr, "BACKEND_TEXT_ERRORS", (TextError,))
+    out, _ = run(DOC, tr.TranslationMemory(), backend=Picky("vi", "en"), batch_size=1)
+    assert "[en] # Tiêu đề" in out
+    assert "\nĐoạn hai.\n" in out
@@ -3,23 +3,59 @@
 """
 Script dịch file README.md sang ngôn ngữ khác
 Usage: python translate_readme.py [--source README.md] [--target en] [--output README_EN.md]
+       [--backend auto|deep|googletrans|fake] [--memory .translation_memory.json] [--workers 4]
 """
 import argparse
+import hashlib
+import json
+import os
 import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 try:
     from deep_translator import GoogleTranslator
     HAS_DEEP_TRANSLATOR = True
 except ImportError:
-    try:
-        from googletrans import Translator
-        HAS_GOOGLETRANS = True
-        HAS_DEEP_TRANSLATOR = False
-    except ImportError:
-        HAS_GOOGLETRANS = False
-        HAS_DEEP_TRANSLATOR = False
+    HAS_DEEP_TRANSLATOR = False
+
+try:
+    from googletrans import Translator
+    HAS_GOOGLETRANS = True
+except ImportError:
+    HAS_GOOGLETRANS = False
+
+# Lỗi mạng / tạm thời: chỉ những lỗi này mới được thử lại
+TRANSIENT_ERRORS = [ConnectionError, TimeoutError]
+# Lỗi của backend cho từng đoạn (quá dài, không dịch được...): giữ nguyên bản gốc
+BACKEND_TEXT_ERRORS = []
+try:
+    import requests
+    TRANSIENT_ERRORS.append(requests.exceptions.RequestException)
+except ImportError:
+    pass
+try:
+    import httpx
+    TRANSIENT_ERRORS.append(httpx.HTTPError)
+except ImportError:
+    pass
+try:
+    from deep_translator import exceptions as deep_translator_exceptions
+    for _name in ("RequestError", "TooManyRequests", "ServerException"):
+        if hasattr(deep_translator_exceptions, _name):
+            TRANSIENT_ERRORS.append(getattr(deep_translator_exceptions, _name))
+    if hasattr(deep_translator_exceptions, "BaseError"):
+        BACKEND_TEXT_ERRORS.append(deep_translator_exceptions.BaseError)
+except ImportError:
+    pass
+TRANSIENT_ERRORS = tuple(TRANSIENT_ERRORS)
+BACKEND_TEXT_ERRORS = tuple(BACKEND_TEXT_ERRORS)
+
+# Giới hạn ký tự mỗi request (deep-translator từ chối text > 5000 ký tự)
+MAX_CHARS = 4500
 
 # Mapping ngôn ngữ
 LANG_MAP = {
@@ -42,28 +78,6 @@ def detect_language(text):
         return 'vi'
     return 'en'
 
-def translate_text(text, source_lang, target_lang, translator=None):
-    """Dịch text sử dụng translator"""
-    if not text.strip():
-        return text
-    
-    try:
-        if HAS_DEEP_TRANSLATOR:
-            if translator is None:
-                translator = GoogleTranslator(source=source_lang, target=target_lang)
-            return translator.translate(text)
-        elif HAS_GOOGLETRANS:
-            if translator is None:
-                translator = Translator()
-            result = translator.translate(text, src=source_lang, dest=target_lang)
-            return result.text
-        else:
-            print("❌ Không tìm thấy thư viện dịch. Cài đặt: pip install deep-translator hoặc googletrans")
-            return text
-    except Exception as e:
-        print(f"⚠️  Lỗi khi dịch: {e}")
-        return text
-
 def parse_markdown(content):
     """Phân tích markdown thành các phần: text, code blocks, links, etc."""
     parts = []
@@ -102,8 +116,245 @@ def parse_markdown(content):
     
     return parts
 
-def translate_markdown(content, source_lang='auto', target_lang='en'):
-    """Dịch markdown content, giữ nguyên format"""
+# Bảo vệ inline code, links [text](url), URLs và text trông giống placeholder trong một lần quét
+PROTECT_PATTERN = re.compile(r'__PH_\d+__|`[^`]+`|\[[^\]]+\]\([^\)]+\)|https?://[^\s\)]+')
+PLACEHOLDER_PATTERN = re.compile(r'__PH_(\d+)__')
+# Tách đoạn văn theo dòng trống, giữ lại phần phân cách
+PARAGRAPH_SPLIT_PATTERN = re.compile(r'(\n[ \t]*\n)')
+
+def protect_text(text):
+    """Thay inline code, links và URLs bằng placeholder. Trả về (text, danh sách bản gốc)"""
+    originals = []
+
+    def _sub(match):
+        originals.append(match.group(0))
+        return f"__PH_{len(originals) - 1}__"
+
+    return PROTECT_PATTERN.sub(_sub, text), originals
+
+def restore_text(text, originals):
+    """Khôi phục placeholder về nội dung gốc"""
+    def _sub(match):
+        i = int(match.group(1))
+        return originals[i] if i < len(originals) else match.group(0)
+
+    return PLACEHOLDER_PATTERN.sub(_sub, text)
+
+def split_long_text(text, max_chars=MAX_CHARS):
+    """
+    Cắt text dài hơn max_chars thành các mảnh, ưu tiên cắt ở xuống dòng,
+    cuối câu rồi khoảng trắng. Trả về list (mảnh, khoảng trắng phân cách sau nó).
+    """
+    pieces = []
+    while len(text) > max_chars:
+        window = text[:max_chars + 1]
+        cut = window.rfind('\n')
+        if cut <= 0:
+            ends = [m.end() for m in re.finditer(r'[.!?。](?=\s)', window)]
+            cut = ends[-1] if ends else -1
+        if cut <= 0:
+            cut = max(window.rfind(' '), window.rfind('\t'))
+        if cut <= 0:
+            cut = max_chars
+        piece = text[:cut].rstrip()
+        rest = text[cut:]
+        stripped = rest.lstrip()
+        pieces.append((piece, text[len(piece):cut] + rest[:len(rest) - len(stripped)]))
+        text = stripped
+    pieces.append((text, ''))
+    return pieces
+
+def split_units(content, max_chars=MAX_CHARS):
+    """
+    Tách markdown thành các đơn vị cấp đoạn văn.
+    Mỗi phần tử là (kind, value): 'raw' giữ nguyên, 'unit' là dict cần dịch.
+    Đoạn dài hơn max_chars được cắt thành nhiều đơn vị.
+    """
+    units = []
+    for part_type, part_content in parse_markdown(content):
+        if part_type == 'code':
+            units.append(('raw', part_content))
+            continue
+        for piece in PARAGRAPH_SPLIT_PATTERN.split(part_content):
+            if not piece:
+                continue
+            core = piece.strip()
+            if not core:
+                units.append(('raw', piece))
+                continue
+            lead = piece[:len(piece) - len(piece.lstrip())]
+            trail = piece[len(piece.rstrip()):]
+            protected, originals = protect_text(core)
+            # Chỉ có code/link/URL thì không cần dịch
+            if not PLACEHOLDER_PATTERN.sub('', protected).strip():
+                units.append(('raw', piece))
+                continue
+            pieces = split_long_text(protected, max_chars)
+            for i, (text, sep) in enumerate(pieces):
+                units.append(('unit', {
+                    'lead': lead if i == 0 else '',
+                    'trail': trail if i == len(pieces) - 1 else sep,
+                    'text': text,
+                    'originals': originals,
+                }))
+    return units
+
+class TranslationMemory:
+    """Bộ nhớ dịch lưu trên đĩa, key = (backend, source, target, sha256(text))"""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.entries = {}
+        self.dirty = False
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Không đọc được translation memory {self.path}: {e}")
+            else:
+                if isinstance(entries, dict):
+                    self.entries = entries
+                else:
+                    print(f"⚠️  Translation memory {self.path} không hợp lệ (không phải object), bỏ qua")
+
+    @staticmethod
+    def key(backend, source_lang, target_lang, text):
+        # Backend nằm trong key để bản dịch của backend 'fake' không bị dùng lại cho backend thật
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{backend}:{source_lang}:{target_lang}:{digest}"
+
+    def get(self, backend, source_lang, target_lang, text):
+        return self.entries.get(self.key(backend, source_lang, target_lang, text))
+
+    def put(self, backend, source_lang, target_lang, text, translated):
+        self.entries[self.key(backend, source_lang, target_lang, text)] = translated
+        self.dirty = True
+
+    def save(self):
+        """Ghi atomic: ghi ra file tạm rồi os.replace"""
+        if not self.path or not self.dirty:
+            return
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+# --- Translator backends ---------------------------------------
+# Mỗi backend cung cấp translate_batch(texts) -> list[str] cùng độ dài
+
+class DeepTranslatorBackend:
+    name = 'deep'
+    available = HAS_DEEP_TRANSLATOR
+
+    def __init__(self, source_lang, target_lang):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+
+    def translate_batch(self, texts):
+        # Tạo translator riêng cho mỗi batch để an toàn khi chạy nhiều thread
+        translator = GoogleTranslator(source=self.source_lang, target=self.target_lang)
+        return translator.translate_batch(texts)
+
+class GoogletransBackend:
+    name = 'googletrans'
+    available = HAS_GOOGLETRANS
+
+    def __init__(self, source_lang, target_lang):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+
+    def translate_batch(self, texts):
+        translator = Translator()
+        results = translator.translate(texts, src=self.source_lang, dest=self.target_lang)
+        return [r.text for r in results]
+
+class FakeBackend:
+    """Backend cục bộ, không gọi mạng - dùng để test pipeline dịch"""
+    name = 'fake'
+    available = True
+
+    def __init__(self, source_lang, target_lang):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def translate_batch(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        return [f"[{self.target_lang}] {t}" for t in texts]
+
+BACKENDS = {
+    'deep': DeepTranslatorBackend,
+    'googletrans': GoogletransBackend,
+    'fake': FakeBackend,
+}
+
+def get_backend(name, source_lang, target_lang):
+    """Khởi tạo backend theo tên; 'auto' chọn thư viện đã cài"""
+    if name == 'auto':
+        if HAS_DEEP_TRANSLATOR:
+            name = 'deep'
+        elif HAS_GOOGLETRANS:
+            name = 'googletrans'
+        else:
+            return None
+    if name not in BACKENDS:
+        raise ValueError(f"Backend không hợp lệ: {name}")
+    backend_cls = BACKENDS[name]
+    if not backend_cls.available:
+        raise RuntimeError(f"Backend '{name}' chưa được cài đặt thư viện tương ứng")
+    return backend_cls(source_lang, target_lang)
+
+def make_batches(texts, batch_size=20, max_chars=MAX_CHARS):
+    """Gom text thành các batch theo số lượng và tổng số ký tự"""
+    batches = []
+    current = []
+    current_chars = 0
+    for text in texts:
+        if current and (len(current) >= batch_size or current_chars + len(text) > max_chars):
+            batches.append(current)
+            current = []
+            current_chars = 0
+        current.append(text)
+        current_chars += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+def translate_batch_with_retry(backend, texts, max_retries=3, backoff=1.0):
+    """
+    Dịch một batch. Lỗi mạng/tạm thời (TRANSIENT_ERRORS) được thử lại với
+    exponential backoff. Hết số lần thử, hoặc backend báo lỗi cho đoạn text
+    (BACKEND_TEXT_ERRORS, kết quả không khớp), thì trả về None để giữ nguyên
+    bản gốc. Lỗi khác được raise.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            translated = backend.translate_batch(texts)
+        except TRANSIENT_ERRORS as e:
+            if attempt == max_retries:
+                print(f"⚠️  Lỗi khi dịch batch ({len(texts)} đoạn): {e}")
+                return None
+            time.sleep(backoff * (2 ** attempt))
+            continue
+        except BACKEND_TEXT_ERRORS as e:
+            print(f"⚠️  Không dịch được batch ({len(texts)} đoạn), giữ nguyên bản gốc: {e}")
+            return None
+        if translated is None or len(translated) != len(texts):
+            print(f"⚠️  Số kết quả dịch không khớp số đoạn gửi đi ({len(texts)} đoạn), giữ nguyên bản gốc")
+            return None
+        return translated
+
+def translate_markdown(content, source_lang='auto', target_lang='en', backend='auto',
+                       memory=None, workers=4, batch_size=20, max_retries=3, backoff=1.0,
+                       max_chars=MAX_CHARS):
+    """
+    Dịch markdown content, giữ nguyên format.
+    Chỉ gửi các đoạn chưa có trong translation memory, theo batch và song song.
+    """
     if source_lang == 'auto':
         source_lang = detect_language(content[:500])  # Lấy mẫu để detect
     
@@ -113,78 +364,67 @@ def translate_markdown(content, source_lang='auto', target_lang='en'):
     
     print(f"🌐 Dịch từ {source_lang} sang {target_lang}...")
     
-    # Phân tích markdown
-    parts = parse_markdown(content)
+    if isinstance(backend, str):
+        backend = get_backend(backend, source_lang, target_lang)
+    if memory is None:
+        memory = TranslationMemory()
     
-    # Khởi tạo translator
-    translator = None
-    if HAS_DEEP_TRANSLATOR:
-        translator = GoogleTranslator(source=source_lang, target=target_lang)
-    elif HAS_GOOGLETRANS:
-        translator = Translator()
+    backend_name = getattr(backend, 'name', type(backend).__name__)
+    units = split_units(content, max_chars)
+    
+    # Loại trùng và tra cứu translation memory
+    unique_texts = list(dict.fromkeys(v['text'] for kind, v in units if kind == 'unit'))
+    translations = {}
+    misses = []
+    for text in unique_texts:
+        cached = memory.get(backend_name, source_lang, target_lang, text)
+        if cached is not None:
+            translations[text] = cached
+        else:
+            misses.append(text)
+    
+    print(f"📦 {len(unique_texts)} đoạn duy nhất: {len(translations)} có sẵn trong cache, {len(misses)} cần dịch")
+    
+    if misses and backend is None:
+        print("❌ Không tìm thấy thư viện dịch. Cài đặt: pip install deep-translator hoặc googletrans")
+    elif misses:
+        batches = make_batches(misses, batch_size=batch_size, max_chars=max_chars)
+        done = 0
+        executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            futures = {
+                executor.submit(translate_batch_with_retry, backend, batch, max_retries, backoff): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                result = future.result()
+                done += 1
+                print(f"📝 Đã xử lý batch {done}/{len(batches)}...", end='\r')
+                if result is None:
+                    continue
+                for text, translated in zip(batch, result):
+                    translations[text] = translated
+                    memory.put(backend_name, source_lang, target_lang, text, translated)
+        finally:
+            # Bị ngắt hoặc lỗi giữa chừng vẫn lưu lại các bản dịch đã có
+            executor.shutdown(wait=False, cancel_futures=True)
+            memory.save()
+        print()
     
     translated_parts = []
-    total_parts = len([p for p in parts if p[0] == 'text'])
-    current_part = 0
+    translated_count = 0
+    for kind, value in units:
+        if kind == 'raw':
+            translated_parts.append(value)
+            continue
+        # Đoạn dịch lỗi thì giữ nguyên bản gốc
+        translated = translations.get(value['text'], value['text'])
+        if value['text'] in translations:
+            translated_count += 1
+        translated_parts.append(value['lead'] + restore_text(translated, value['originals']) + value['trail'])
     
-    for part_type, part_content in parts:
-        if part_type == 'code':
-            # Giữ nguyên code blocks
-            translated_parts.append(part_content)
-        else:
-            # Dịch text, nhưng giữ nguyên inline code và links
-            text = part_content
-            
-            # Bảo vệ inline code
-            inline_codes = {}
-            code_counter = 0
-            for match in re.finditer(r'`([^`]+)`', text):
-                placeholder = f"__INLINE_CODE_{code_counter}__"
-                inline_codes[placeholder] = match.group(0)
-                text = text.replace(match.group(0), placeholder)
-                code_counter += 1
-            
-            # Bảo vệ URLs
-            urls = {}
-            url_counter = 0
-            for match in re.finditer(r'https?://[^\s\)]+', text):
-                placeholder = f"__URL_{url_counter}__"
-                urls[placeholder] = match.group(0)
-                text = text.replace(match.group(0), placeholder)
-                url_counter += 1
-            
-            # Bảo vệ links [text](url)
-            links = {}
-            link_counter = 0
-            for match in re.finditer(r'\[([^\]]+)\]\(([^\)]+)\)', text):
-                placeholder = f"__LINK_{link_counter}__"
-                links[placeholder] = match.group(0)
-                text = text.replace(match.group(0), placeholder)
-                link_counter += 1
-            
-            # Dịch text
-            if text.strip():
-                current_part += 1
-                print(f"📝 Đang dịch phần {current_part}/{total_parts}...", end='\r')
-                translated = translate_text(text, source_lang, target_lang, translator)
-            else:
-                translated = text
-            
-            # Khôi phục inline code
-            for placeholder, original in inline_codes.items():
-                translated = translated.replace(placeholder, original)
-            
-            # Khôi phục URLs
-            for placeholder, original in urls.items():
-                translated = translated.replace(placeholder, original)
-            
-            # Khôi phục links
-            for placeholder, original in links.items():
-                translated = translated.replace(placeholder, original)
-            
-            translated_parts.append(translated)
-    
-    print(f"\n✅ Đã dịch {current_part} phần text")
+    print(f"✅ Đã dịch {translated_count} đoạn text")
     return ''.join(translated_parts)
 
 def main():
@@ -193,11 +433,21 @@ def main():
     parser.add_argument("--target", default="en", help="Ngôn ngữ đích: en, vi (mặc định: en)")
     parser.add_argument("--output", help="File output (mặc định: README_{target}.md)")
     parser.add_argument("--from-lang", default="auto", help="Ngôn ngữ nguồn: auto, vi, en (mặc định: auto)")
+    parser.add_argument("--backend", default="auto", choices=["auto"] + list(BACKENDS),
+                        help="Backend dịch: auto, deep, googletrans, fake (mặc định: auto)")
+    parser.add_argument("--memory", default=".translation_memory.json",
+                        help="File translation memory, rỗng để tắt (mặc định: .translation_memory.json)")
+    parser.add_argument("--workers", type=int, default=4, help="Số request dịch song song (mặc định: 4)")
+    parser.add_argument("--batch-size", type=int, default=20, help="Số đoạn mỗi request (mặc định: 20)")
+    parser.add_argument("--max-retries", type=int, default=3, help="Số lần thử lại khi lỗi (mặc định: 3)")
     
     args = parser.parse_args()
     
     # Kiểm tra thư viện dịch
-    if not HAS_DEEP_TRANSLATOR and not HAS_GOOGLETRANS:
+    if args.backend != "auto" and not BACKENDS[args.backend].available:
+        print(f"❌ Backend '{args.backend}' chưa được cài đặt thư viện tương ứng!")
+        sys.exit(1)
+    if args.backend == "auto" and not HAS_DEEP_TRANSLATOR and not HAS_GOOGLETRANS:
         print("❌ Không tìm thấy thư viện dịch!")
         print("📦 Cài đặt một trong các thư viện sau:")
         print("   pip install deep-translator")
@@ -224,7 +474,15 @@ def main():
     
     # Dịch
     print(f"🔄 Bắt đầu dịch...")
-    translated_content = translate_markdown(content, args.from_lang, args.target)
+    memory = TranslationMemory(args.memory or None)
+    translated_content = translate_markdown(
+        content, args.from_lang, args.target,
+        backend=args.backend,
+        memory=memory,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_retries=args.max_retries,
+    )
     
     # Lưu file
     print(f"💾 Lưu file: {output_path}")